@@ -2,10 +2,14 @@
 
 import shlex
 import sys
+import json
 import asyncio
 import logging
-from subprocess import Popen
-from time import sleep
+
+try:
+    import snapconfig
+except ImportError:
+    snapconfig = None
 
 log = logging.getLogger("Process-Manager")
 log.setLevel(logging.INFO)
@@ -19,6 +23,9 @@ class RoboProcess:
             raise ValueError('command must be a string')
         self.name = name
         self.cmd = cmd
+        # cmd never changes, so tokenize it once here instead of on
+        # every (re)start.
+        self._args = shlex.split(cmd)
         self.pid = None
         self.released = False
         self.process = None
@@ -39,7 +46,7 @@ class RoboProcess:
         # kill the process if it exists
         await self.kill()
 
-        self.process = await asyncio.create_subprocess_shell(self.cmd)
+        self.process = await asyncio.create_subprocess_exec(*self._args)
 
         self.pid = self.process.pid
         return self.process
@@ -55,7 +62,16 @@ class RoboProcess:
         """
         # start the loop until the process exists successfully
         returncode = None
-        self.process = await self.restart()
+        try:
+            self.process = await self.restart()
+        except (FileNotFoundError, PermissionError) as err:
+            # The shell used to absorb an unresolvable command as exit
+            # 127/126; keep it a handled failure routed through
+            # on_exit instead of an exception escaping the run() task.
+            returncode = 126 if isinstance(err, PermissionError) else 127
+            log.warning("Process '{}' failed to start, exiting with {}: {}".format(self.name, returncode, err))
+            self.on_exit(returncode)
+            return returncode
         while self.process:
             log.info("Started process({}, '{}')".format(self.pid, self.name))
             returncode = await self.process.wait()
@@ -71,21 +87,37 @@ class RoboProcess:
                 log.info("Process ({}, {}) exited successfully with {}.".format(last_pid, self.name, returncode))
         return returncode
 
-    async def kill(self, timeout=1, release=False):
+    def send_terminate(self, release=False):
         """
-        Stop the process.
+        Ask the process to exit without waiting for it.
 
         Ignored if the process is not running.
         """
         if self.process:
             self.process.terminate()
+            self.released = release
+
+    async def join(self, timeout=1):
+        """
+        Wait for the process to exit, killing it once timeout expires.
+        This function is a coroutine.
+        """
+        if self.process:
             try:
                 future = self.process.wait()
                 await asyncio.wait_for(future, timeout)
             except asyncio.TimeoutError:
                 self.process.kill()
                 await self.process.wait()
-            self.released = release
+
+    async def kill(self, timeout=1, release=False):
+        """
+        Stop the process.
+
+        Ignored if the process is not running.
+        """
+        self.send_terminate(release=release)
+        await self.join(timeout)
 
     def on_exit(self, returncode):
         """To be called when the process exits"""
@@ -120,6 +152,9 @@ class ProcessManager:
     def __init__(self):
         """Initialize a process manager."""
         self.processes = {}  # store processes by name
+        # Frozen (name, process) pairs for the start/stop-everything
+        # paths, avoiding a dict lookup per process.
+        self._ordered = ()
         self._futures = []
 
     def __enter__(self):
@@ -150,7 +185,28 @@ class ProcessManager:
         if roboprocess.name in self.processes:
             raise ValueError('Process with the same name exists: {name}')
         self.processes[roboprocess.name] = roboprocess
+        self._ordered = tuple(self.processes.items())
+
+
+    def loadConfig(self, file_name):
+        """
+        Load this host's processes from a JSON config file.
+
+        Arguments:
+        file_name - path to a JSON file mapping hosts to lists of
+                    {'name': ..., 'command': ...} entries.
 
+        Uses snapconfig's mmap-backed cache when it is installed, so
+        sibling manager processes loading the same config share one
+        parsed copy; otherwise falls back to stdlib json.
+        """
+        if snapconfig is not None:
+            config = snapconfig.load(file_name)
+        else:
+            with open(file_name) as config_file:
+                config = json.load(config_file)
+        for entry in config['localhost']:
+            self.createProcess(entry['name'], entry['command'])
 
     def start(self, *names):
         """
@@ -158,14 +214,18 @@ class ProcessManager:
 
         If no arguments are provided, starts all processes.
         """
-        processes = names if names else self.processes.keys()
-        for process in processes:
-            try:
-                print('Starting:', process)
-                self._futures.append(asyncio.ensure_future(
-                    self.processes[process].run()))
-            except KeyError:
-                pass
+        if names:
+            starting = []
+            for process in names:
+                try:
+                    starting.append((process, self.processes[process]))
+                except KeyError:
+                    pass
+        else:
+            starting = self._ordered
+        for name, proc in starting:
+            print('Starting:', name)
+            self._futures.append(asyncio.ensure_future(proc.run()))
 
     def stop(self, *names, timeout=0):
         """
@@ -173,14 +233,23 @@ class ProcessManager:
 
         If no arguments are provided, stops all processes.
         """
-        processes = names if names else self.processes.keys()
-        for process in processes:
-            try:
-                print('Stopping:', process)
-                asyncio.ensure_future(
-                        self.processes[process].kill(timeout=timeout, release=True))
-            except KeyError:
-                pass
+        if names:
+            stopping = []
+            for process in names:
+                try:
+                    stopping.append((process, self.processes[process]))
+                except KeyError:
+                    pass
+        else:
+            stopping = self._ordered
+        # Terminate everything up front, then wait on all at once, so
+        # shutdown is bounded by the slowest process instead of the sum
+        # of every timeout.
+        for name, proc in stopping:
+            print('Stopping:', name)
+            proc.send_terminate(release=True)
+        self._futures.append(asyncio.ensure_future(asyncio.gather(
+            *(proc.join(timeout) for _, proc in stopping))))
 
     @staticmethod
     def run():
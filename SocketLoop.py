@@ -0,0 +1,382 @@
+"""THIS FILE IS SUBJECT TO THE LICENSE TERMS GRANTED BY THE UNIVERSITY OF SASKATCHEWAN SPACE TEAM (USST)."""
+
+import os
+import sys
+import json
+import socket
+import asyncio
+import logging
+from time import time
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = logging.getLogger("Socket-Loop")
+log.setLevel(logging.INFO)
+
+
+class BaseSocketLoop:
+    """
+    Wraps an event loop with non-blocking socket primitives.
+
+    Subclasses define how packets are serialized by implementing
+    encode(packet) and decode(packet).
+    """
+
+    def __init__(self, bufsize=1024):
+        """Initialize a socket loop with its own event loop."""
+        if uvloop is not None:
+            self.loop = uvloop.new_event_loop()
+        else:
+            self.loop = asyncio.new_event_loop()
+        self.bufsize = bufsize
+        self._tg = None
+        self._main = None
+        # Reusable receive buffer for the datagram paths, which fill
+        # and copy it synchronously inside one coroutine step, so the
+        # hot paths do not allocate a fresh bufsize-large bytes object
+        # per packet.
+        self._recv_buf = bytearray(bufsize)
+        self._recv_mv = memoryview(self._recv_buf)
+        # Per-socket buffers for recv: sock_recv_into fills the buffer
+        # from the loop's reader callback, so concurrent receivers
+        # sharing one buffer would overwrite each other's data.
+        self._sock_bufs = {}
+
+    def socket(self, kind):
+        """Create a non-blocking socket of the given kind."""
+        sock = socket.socket(socket.AF_INET, kind)
+        # SO_REUSEPORT gives true shared listening (the kernel load
+        # balances across sockets bound to the port); SO_REUSEADDR is
+        # only a fallback where REUSEPORT does not exist.
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setblocking(False)
+        return sock
+
+    def encode(self, packet):
+        """Serialize a packet to bytes."""
+        raise NotImplementedError('Subclasses must define encode(packet)')
+
+    def decode(self, packet):
+        """Deserialize a packet from bytes."""
+        raise NotImplementedError('Subclasses must define decode(packet)')
+
+    async def recv(self, sock):
+        """
+        Receive a packet from a connected socket. This function is a coroutine.
+
+        Returns
+        -------
+        object
+            The decoded packet, or None if it could not be decoded.
+        """
+        fd = sock.fileno()
+        try:
+            buf = self._sock_bufs[fd]
+        except KeyError:
+            buf = self._sock_bufs[fd] = memoryview(bytearray(self.bufsize))
+        n = await self.loop.sock_recv_into(sock, buf)
+        return self.decode(bytes(buf[:n]))
+
+    async def send(self, sock, packet):
+        """Send a packet over a connected socket. This function is a coroutine."""
+        await self.loop.sock_sendall(sock, self.encode(packet))
+
+    def _sock_ready(self, future):
+        if not future.done():
+            future.set_result(None)
+
+    async def _wait_readable(self, sock):
+        """Suspend until sock is readable. This function is a coroutine."""
+        future = self.loop.create_future()
+        fd = sock.fileno()
+        self.loop.add_reader(fd, self._sock_ready, future)
+        try:
+            await future
+        finally:
+            self.loop.remove_reader(fd)
+
+    async def _wait_writable(self, sock):
+        """Suspend until sock is writable. This function is a coroutine."""
+        future = self.loop.create_future()
+        fd = sock.fileno()
+        self.loop.add_writer(fd, self._sock_ready, future)
+        try:
+            await future
+        finally:
+            self.loop.remove_writer(fd)
+
+    async def recvfrom(self, sock):
+        """
+        Receive a datagram from an unconnected socket. This function is
+        a coroutine. Tries the socket directly first, so a future is
+        only allocated when the socket has nothing queued.
+
+        Returns
+        -------
+        tuple
+            A (packet, address) tuple.
+        """
+        while True:
+            try:
+                n, address = sock.recvfrom_into(self._recv_buf)
+            except (BlockingIOError, InterruptedError):
+                await self._wait_readable(sock)
+            else:
+                return self.decode(bytes(self._recv_mv[:n])), address
+
+    async def recvfrom_many(self, sock, max_batch=32):
+        """
+        Drain up to max_batch datagrams from an unconnected socket,
+        amortizing the reader registration over every queued datagram.
+        This function is a coroutine.
+
+        Returns
+        -------
+        list
+            A non-empty list of (packet, address) tuples.
+        """
+        while True:
+            packets = []
+            while len(packets) < max_batch:
+                try:
+                    n, address = sock.recvfrom_into(self._recv_buf)
+                except (BlockingIOError, InterruptedError):
+                    break
+                packets.append((self.decode(bytes(self._recv_mv[:n])),
+                                address))
+            if packets:
+                return packets
+            await self._wait_readable(sock)
+
+    async def sendto(self, sock, packet, address):
+        """
+        Send a datagram to an address over an unconnected socket. This
+        function is a coroutine. Tries the socket directly first, so a
+        future is only allocated when the send buffer is full.
+        """
+        data = self.encode(packet)
+        while True:
+            try:
+                sock.sendto(data, address)
+            except (BlockingIOError, InterruptedError):
+                await self._wait_writable(sock)
+            else:
+                return
+
+    async def _run(self, coros):
+        """Host the loop's tasks in a task group. This function is a coroutine."""
+        async with asyncio.TaskGroup() as tg:
+            self._tg = tg
+            for coro in coros:
+                tg.create_task(coro)
+            # Block until close() cancels us; unwinding the group then
+            # cancels exactly its own tasks.
+            await asyncio.Event().wait()
+
+    def run(self, *coros):
+        """Run the given coroutines until interrupted."""
+        self._main = self.loop.create_task(self._run(coros))
+        try:
+            self.loop.run_until_complete(self._main)
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Cancel the task group and close the event loop."""
+        if self._main is not None and not self._main.done():
+            self._main.cancel()
+            try:
+                self.loop.run_until_complete(self._main)
+            except asyncio.CancelledError:
+                pass
+        self.loop.close()
+
+
+class JSONSocketLoop(BaseSocketLoop):
+    """Socket loop that serializes packets as JSON."""
+
+    def encode(self, packet):
+        """Serialize a packet to JSON encoded bytes."""
+        if orjson is not None:
+            return orjson.dumps(packet)
+        return json.dumps(packet).encode('utf-8')
+
+    def decode(self, packet):
+        """Deserialize a packet from JSON encoded bytes."""
+        # A packet we sent always starts with '{' or '['; anything else
+        # is noise on the broadcast port, so skip the parser and its
+        # exception unwind with a single byte compare.
+        if not packet or packet[0] not in (0x7b, 0x5b):  # b'{', b'['
+            return None
+        try:
+            if orjson is not None:
+                return orjson.loads(packet)
+            return json.loads(packet)
+        except ValueError:  # JSONDecodeError for both json and orjson
+            return None
+
+
+class _DiscoverProtocol(asyncio.DatagramProtocol):
+    """
+    Feeds raw datagrams received on the transport into a queue.
+
+    datagram_received does nothing but enqueue, so the transport's
+    C-level receive path keeps draining the kernel buffer while the
+    consumer runs the decoder.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def datagram_received(self, data, addr):
+        self.queue.put_nowait((data, addr))
+
+
+class ServerLoop(JSONSocketLoop):
+    """
+    Listens for services advertising themselves over UDP broadcast,
+    and serves requests from them over TCP.
+    """
+
+    def __init__(self, address, bufsize=1024):
+        """Initialize a server loop bound to address."""
+        super().__init__(bufsize)
+        self.address = address
+
+    async def discover(self):
+        """Listen for UDP broadcasts from services. This function is a coroutine."""
+        queue = asyncio.Queue()
+        # One socket only: the kernel's reuseport flow-hash applies to
+        # unicast, but broadcast datagrams are delivered to every
+        # socket in the group, so a per-CPU group would receive each
+        # advertise packet once per socket.
+        sock = self.socket(socket.SOCK_DGRAM)
+        sock.bind(self.address)
+        # Grow the kernel receive buffer so advertise bursts are
+        # absorbed instead of dropped while Python is busy. The
+        # kernel clamps this to net.core.rmem_max.
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                        8 * 1024 * 1024)
+        # Steer receive processing to the core the loop thread is
+        # pinned to (see server()), keeping the sk_buff and the
+        # userspace buffer in the same cache.
+        if hasattr(socket, 'SO_INCOMING_CPU'):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET,
+                                socket.SO_INCOMING_CPU, 0)
+            except OSError:
+                pass
+        await self.loop.create_datagram_endpoint(
+            lambda: _DiscoverProtocol(queue), sock=sock)
+        while True:
+            data, address = await queue.get()
+            packet = self.decode(data)
+            print('{}: {}'.format(address, packet))
+
+    async def handler(self, sock):
+        """Echo packets back to a connected service. This function is a coroutine."""
+        while True:
+            packet = await self.recv(sock)
+            if packet is None:
+                break
+            await self.send(sock, packet)
+        sock.close()
+
+    async def listen(self):
+        """Accept TCP connections from services. This function is a coroutine."""
+        sock = self.socket(socket.SOCK_STREAM)
+        sock.bind(self.address)
+        sock.listen(5)
+        while True:
+            client, _ = await self.loop.sock_accept(sock)
+            self._tg.create_task(self.handler(client))
+
+    def run(self):
+        """Run the discover and listen tasks until interrupted."""
+        super().run(self.discover(), self.listen())
+
+
+class ServiceLoop(JSONSocketLoop):
+    """Advertises a service over UDP broadcast."""
+
+    def __init__(self, broadcast, port, bufsize=1024):
+        """Initialize a service loop broadcasting to (broadcast, port)."""
+        super().__init__(bufsize)
+        self.broadcast = broadcast
+        self.port = port
+        # The advertise payload schema is fixed, so pre-encode the JSON
+        # framing and only format the timestamp per tick.
+        self._prefix = b'{"time": '
+        self._suffix = b'}'
+        self._send_q = asyncio.Queue(maxsize=64)
+
+    async def advertise(self):
+        """Broadcast this service's presence once a second. This function is a coroutine."""
+        address = (self.broadcast, self.port)
+        while True:
+            packet = self._prefix + b'%.6f' % time() + self._suffix
+            try:
+                self._send_q.put_nowait((packet, address))
+            except asyncio.QueueFull:
+                pass  # advertise packets are ephemeral; drop when backed up
+            await asyncio.sleep(1)
+
+    async def _sender(self, max_batch=32):
+        """
+        Drain queued datagrams onto the broadcast transport, up to
+        max_batch per wakeup. This function is a coroutine.
+        """
+        sock = self.socket(socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        transport, _ = await self.loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, sock=sock)
+        while True:
+            packet, address = await self._send_q.get()
+            transport.sendto(packet, address)
+            for _ in range(max_batch - 1):
+                try:
+                    packet, address = self._send_q.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                transport.sendto(packet, address)
+
+    def run(self):
+        """Run the advertise and sender tasks until interrupted."""
+        super().run(self.advertise(), self._sender())
+
+
+def server(address=('', 12345)):
+    """Run a server loop in the foreground."""
+    # Pin the loop thread to one core so packets steered there by
+    # SO_INCOMING_CPU stay local to its cache.
+    if hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, {0})
+        except OSError:
+            pass
+    ServerLoop(address).run()
+
+
+def service(broadcast='255.255.255.255', port=12345):
+    """Run a service loop in the foreground."""
+    ServiceLoop(broadcast, port).run()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'service':
+        service()
+    else:
+        server()